@@ -11,6 +11,36 @@ class Settings:
     HTTP_REFERER: str = os.getenv("HTTP_REFERER", "http://localhost:5173")
     X_TITLE: str = os.getenv("X_TITLE", "LLM Playground")
     
+    # 媒体预处理
+    MEDIA_PROCESS_WORKERS: int = int(os.getenv("MEDIA_PROCESS_WORKERS", "2"))
+    MEDIA_CACHE_SIZE: int = int(os.getenv("MEDIA_CACHE_SIZE", "128"))
+    MEDIA_CACHE_MAX_BYTES: int = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+    IMAGE_FORMAT: str = os.getenv("IMAGE_FORMAT", "WEBP")
+    IMAGE_QUALITY: int = int(os.getenv("IMAGE_QUALITY", "85"))
+    IMAGE_MAX_DIMENSION: int = int(os.getenv("IMAGE_MAX_DIMENSION", "2048"))
+    # 按模型ID前缀匹配的最长边限制，超过视觉模型实际使用的分辨率没有意义
+    MODEL_IMAGE_MAX_DIMENSIONS: dict = {
+        "anthropic/": 1568,
+        "openai/": 2048,
+        "google/": 3072,
+    }
+    AUDIO_FORMAT: str = os.getenv("AUDIO_FORMAT", "mp3")
+    
+    # 提示词前缀缓存
+    PROMPT_CACHE_ENABLED: bool = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+    PROMPT_CACHE_MIN_TOKENS: int = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+    PROMPT_CACHE_DOCUMENT_TOKENS: int = int(os.getenv("PROMPT_CACHE_DOCUMENT_TOKENS", "2048"))
+    # 模型目录缓存时间（秒）
+    MODELS_CACHE_TTL: int = int(os.getenv("MODELS_CACHE_TTL", "300"))
+    MODELS_RETRY_INTERVAL: int = int(os.getenv("MODELS_RETRY_INTERVAL", "30"))
+    MODELS_FETCH_TIMEOUT: float = float(os.getenv("MODELS_FETCH_TIMEOUT", "5"))
+    
+    # WebSocket 聊天
+    WS_MAX_STREAMS: int = int(os.getenv("WS_MAX_STREAMS", "4"))  # 每个连接的最大并发生成数
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))  # 发送队列满时暂停生成
+    WS_MAX_CONVERSATIONS: int = int(os.getenv("WS_MAX_CONVERSATIONS", "8"))  # 每个连接保存的最大会话数
+    WS_HISTORY_MAX_BYTES: int = int(os.getenv("WS_HISTORY_MAX_BYTES", str(32 * 1024 * 1024)))  # 每个连接保存历史的总大小
+    
     # CORS
     CORS_ORIGINS: list = [
         "http://localhost:5173",
@@ -1,4 +1,6 @@
 """LLM Playground 后端主入口"""
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,12 +8,32 @@ from fastapi.staticfiles import StaticFiles
 
 from app.config import settings
 from app.routers import chat, models
+from app.services.media import media_processor
+from app.services.openrouter import openrouter_service
+
+
+async def refresh_models():
+    """在后台定期刷新模型目录，聊天请求只读取已加载的目录"""
+    while True:
+        await asyncio.to_thread(openrouter_service.get_models)
+        await asyncio.sleep(min(settings.MODELS_CACHE_TTL, settings.MODELS_RETRY_INTERVAL))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期 - 后台刷新模型目录，关闭时释放媒体预处理进程池"""
+    refresher = asyncio.create_task(refresh_models())
+    yield
+    refresher.cancel()
+    media_processor.shutdown()
+
 
 # 创建 FastAPI 应用
 app = FastAPI(
     title="LLM Playground API",
     description="多模态 LLM Playground 后端 API - 基于 OpenRouter",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # 挂载静态文件目录（用于测试图片等）
@@ -1,12 +1,15 @@
 """聊天路由"""
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, WebSocket
 from fastapi.responses import StreamingResponse
-from typing import List
+from typing import List, Optional
 import json
 import base64
 
 from app.schemas.chat import ChatRequest, Message
 from app.services.openrouter import openrouter_service
+from app.services.media import media_processor
+from app.services.prompt_cache import prompt_cache_stats
+from app.services.chat_connection import ChatConnection
 
 router = APIRouter()
 
@@ -22,27 +25,10 @@ async def chat_stream(request: ChatRequest):
     - 图片生成 (让模型生成图片)
     - 音频处理
     """
-    # 提取超参数
-    params = request.hyper_params
-    temperature = params.temperature if params else 0.7
-    max_tokens = params.max_tokens if params else 4096
-    top_p = params.top_p if params else 1.0
-    frequency_penalty = params.frequency_penalty if params else 0.0
-    presence_penalty = params.presence_penalty if params else 0.0
-    
     def generate():
         """生成 SSE 流"""
         try:
-            for chunk in openrouter_service.chat_stream(
-                model=request.model,
-                messages=request.messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                top_p=top_p,
-                frequency_penalty=frequency_penalty,
-                presence_penalty=presence_penalty,
-                modalities=request.modalities,
-            ):
+            for chunk in openrouter_service.chat_stream_request(request):
                 # SSE 格式
                 yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
             
@@ -63,6 +49,22 @@ async def chat_stream(request: ChatRequest):
     )
 
 
+@router.websocket("/ws")
+async def chat_ws(websocket: WebSocket):
+    """
+    WebSocket 聊天接口 - 每个浏览器会话保持一个连接
+    
+    支持:
+    - 按 stream_id 多路复用多个并发生成
+    - 增量发送消息（服务端保存历史）
+    - 通过 cancel 消息取消生成
+    - 发送队列满时暂停生成（流控）
+    
+    事件格式与 /stream 相同，详见 ChatConnection
+    """
+    await ChatConnection(websocket).run()
+
+
 @router.post("/complete")
 async def chat_complete(request: ChatRequest):
     """
@@ -86,12 +88,27 @@ async def chat_complete(request: ChatRequest):
     return result
 
 
+@router.get("/cache-stats")
+async def cache_stats():
+    """
+    提示词缓存统计 - 按模型返回缓存 token 数、费用和首 token 延迟
+    """
+    return {"models": prompt_cache_stats.summary()}
+
+
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(
+    file: UploadFile = File(...),
+    model: Optional[str] = Form(None),
+    audio_format: Optional[str] = Form(None),
+):
     """
-    文件上传接口 - 将文件转换为 base64
+    文件上传接口 - 预处理后将文件转换为 base64
     
     支持: 图片 (png, jpg, gif, webp), 音频 (wav, mp3, m4a), 视频 (mp4, webm)
+    
+    - 图片按模型的最大尺寸缩放并重新编码
+    - 音频转码为 input_audio.format 所需格式
     """
     # 读取文件内容
     content = await file.read()
@@ -99,11 +116,21 @@ async def upload_file(file: UploadFile = File(...)):
     # 获取 MIME 类型
     content_type = file.content_type or "application/octet-stream"
     
+    # 预处理（在进程池中执行，不阻塞事件循环）
+    processed = await media_processor.process(
+        content,
+        content_type,
+        model=model,
+        audio_format=audio_format,
+    )
+    processed_content = processed["content"]
+    processed_type = processed["content_type"]
+    
     # 转换为 base64
-    base64_data = base64.b64encode(content).decode("utf-8")
+    base64_data = base64.b64encode(processed_content).decode("utf-8")
     
     # 构建 data URL
-    data_url = f"data:{content_type};base64,{base64_data}"
+    data_url = f"data:{processed_type};base64,{base64_data}"
     
     # 确定文件类型
     file_type = "unknown"
@@ -116,8 +143,11 @@ async def upload_file(file: UploadFile = File(...)):
     
     return {
         "filename": file.filename,
-        "content_type": content_type,
+        "content_type": processed_type,
         "file_type": file_type,
         "data_url": data_url,
-        "size": len(content),
+        "size": len(processed_content),
+        "original_size": len(content),
+        "bytes_saved": len(content) - len(processed_content),
+        "cached": processed["cached"],
     }
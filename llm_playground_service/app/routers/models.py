@@ -3,6 +3,7 @@ from fastapi import APIRouter
 from typing import List, Dict, Any
 
 from app.services.openrouter import openrouter_service
+from app.services.prompt_cache import supports_cache_control
 
 router = APIRouter()
 
@@ -49,7 +50,11 @@ def format_model_info(model: Dict[str, Any]) -> Dict[str, Any]:
         "pricing": {
             "prompt": pricing.get("prompt", "0"),
             "completion": pricing.get("completion", "0"),
+            "input_cache_read": pricing.get("input_cache_read"),
+            "input_cache_write": pricing.get("input_cache_write"),
         },
+        # 是否需要显式的提示词缓存断点
+        "supports_prompt_cache": supports_cache_control(model),
         # 支持的参数
         "supported_parameters": model.get("supported_parameters", []),
     }
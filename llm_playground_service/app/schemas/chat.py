@@ -47,6 +47,24 @@ class ChatRequest(BaseModel):
     modalities: Optional[List[str]] = None  # ["text", "image", "audio"]
 
 
+class WsClientMessage(BaseModel):
+    """WebSocket 客户端消息"""
+    type: str  # "chat" | "cancel"
+    stream_id: str
+    conversation_id: str = "default"
+    model: Optional[str] = None
+    # 增量消息：只包含服务端历史之后的新消息
+    messages: List[Message] = []
+    # 为 True 时先清空服务端历史
+    reset: bool = False
+    # 客户端认为服务端已保存的历史条数，不一致时服务端要求重新同步
+    history_length: Optional[int] = None
+    # 为 False 时生成结束后不保存历史（一次性会话）
+    store: bool = True
+    hyper_params: Optional[HyperParams] = None
+    modalities: Optional[List[str]] = None
+
+
 class ModelInfo(BaseModel):
     """模型信息"""
     id: str
@@ -0,0 +1,208 @@
+"""WebSocket 聊天连接 - 在一个连接上多路复用多个流式生成"""
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from starlette.concurrency import iterate_in_threadpool
+
+from app.config import settings
+from app.schemas.chat import ChatRequest, Message, WsClientMessage
+from app.services.openrouter import openrouter_service
+
+logger = logging.getLogger(__name__)
+
+
+def _message_size(messages: List[Message]) -> int:
+    """估算消息占用的字节数（主要是 base64 附件）"""
+    return sum(len(message.model_dump_json()) for message in messages)
+
+
+class ChatConnection:
+    """
+    单个浏览器会话的 WebSocket 连接
+
+    客户端消息:
+    - {"type": "chat", "stream_id", "conversation_id", "model", "messages", ...}: 开始一次生成，
+      messages 只包含服务端历史之后的新消息，history_length 为客户端认为服务端已保存的条数，
+      reset 为 True 时先清空历史，store 为 False 时不保存本轮历史
+    - {"type": "cancel", "stream_id"}: 取消生成
+
+    服务端消息与 SSE 接口的事件格式相同，附带 stream_id。每个 chat 消息都以一个结束事件收尾：
+    - {"type": "done"}: 生成结束（包括被拒绝或出错的情况，此前会先发送 error）
+    - {"type": "cancelled"}: 生成被取消
+    - {"type": "resync"}: 服务端历史与 history_length 不一致（如已被淘汰），需要重置后重发
+
+    同一会话同时只能有一个生成，并发生成需要使用不同的 conversation_id。
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self._streams: Dict[str, asyncio.Task] = {}
+        # conversation_id -> 正在生成的 stream_id
+        self._active: Dict[str, str] = {}
+        # conversation_id -> 服务端保存的历史消息，按最近使用排序
+        self._histories: "OrderedDict[str, List[Message]]" = OrderedDict()
+        self._history_sizes: Dict[str, int] = {}
+        # 所有生成共享的发送队列，客户端读取慢时队列写满，生成随之暂停
+        self._send_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+
+    async def run(self):
+        """处理连接直到客户端断开"""
+        # WebSocket 不经过 CORS 中间件，需要自行校验来源
+        origin = self.websocket.headers.get("origin")
+        if origin and origin not in settings.CORS_ORIGINS:
+            await self.websocket.close(code=1008)
+            return
+        await self.websocket.accept()
+        sender = asyncio.create_task(self._sender())
+        try:
+            while True:
+                text = await self.websocket.receive_text()
+                await self._dispatch(text)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in self._streams.values():
+                task.cancel()
+            await asyncio.gather(*self._streams.values(), return_exceptions=True)
+            sender.cancel()
+
+    async def _sender(self):
+        """唯一的写入者，保证帧不会交错"""
+        while True:
+            event = await self._send_queue.get()
+            await self.websocket.send_text(json.dumps(event, ensure_ascii=False))
+
+    async def _send(self, stream_id: str, event: Dict[str, Any]):
+        await self._send_queue.put({"stream_id": stream_id, **event})
+
+    async def _reject(self, stream_id: str, content: str):
+        """拒绝一个 chat 消息，发送错误和结束事件"""
+        await self._send(stream_id, {"type": "error", "content": content})
+        await self._send(stream_id, {"type": "done"})
+
+    def _store_history(self, conversation_id: str, messages: List[Message], size: int):
+        """保存会话历史，超出会话数或总大小限制时淘汰最久未使用的会话"""
+        self._histories[conversation_id] = messages
+        self._history_sizes[conversation_id] = size
+        self._histories.move_to_end(conversation_id)
+        while self._histories and (
+            len(self._histories) > settings.WS_MAX_CONVERSATIONS
+            or sum(self._history_sizes.values()) > settings.WS_HISTORY_MAX_BYTES
+        ):
+            evicted, _ = self._histories.popitem(last=False)
+            self._history_sizes.pop(evicted, None)
+
+    async def _dispatch(self, text: str):
+        """解析并处理客户端消息"""
+        try:
+            message = WsClientMessage.model_validate_json(text)
+        except ValidationError as e:
+            # 尽量取出 stream_id，让客户端能结束对应的流
+            try:
+                stream_id = str(json.loads(text).get("stream_id", ""))
+            except (ValueError, AttributeError):
+                stream_id = ""
+            await self._reject(stream_id, str(e))
+            return
+
+        stream_id = message.stream_id
+        if message.type == "cancel":
+            task = self._streams.get(stream_id)
+            if task:
+                task.cancel()
+            return
+
+        if message.type != "chat":
+            await self._reject(stream_id, f"Unknown message type: {message.type}")
+            return
+        if not message.model:
+            await self._reject(stream_id, "model is required")
+            return
+        if stream_id in self._streams:
+            await self._reject(stream_id, "Duplicate stream_id")
+            return
+        if len(self._streams) >= settings.WS_MAX_STREAMS:
+            await self._reject(stream_id, "Too many concurrent streams")
+            return
+
+        conversation_id = message.conversation_id
+        if conversation_id in self._active:
+            await self._reject(stream_id, "Conversation already has a stream in progress")
+            return
+
+        if message.reset:
+            history, base_size = [], 0
+        else:
+            history = self._histories.get(conversation_id, [])
+            base_size = self._history_sizes.get(conversation_id, 0)
+            if message.history_length is not None and message.history_length != len(history):
+                await self._send(stream_id, {"type": "resync"})
+                return
+
+        # 历史中的消息已校验过，不再重复校验
+        request = ChatRequest.model_construct(
+            model=message.model,
+            messages=history + message.messages,
+            hyper_params=message.hyper_params,
+            modalities=message.modalities,
+        )
+        self._active[conversation_id] = stream_id
+        self._streams[stream_id] = asyncio.create_task(
+            self._generate(
+                stream_id,
+                conversation_id,
+                request,
+                base_size + _message_size(message.messages),
+                message.store,
+            )
+        )
+
+    async def _generate(
+        self,
+        stream_id: str,
+        conversation_id: str,
+        request: ChatRequest,
+        size: int,
+        store: bool = True,
+    ):
+        """执行一次生成，成功且 store 为 True 时把本轮消息保存为会话历史"""
+        generator = openrouter_service.chat_stream_request(request)
+        text_parts = []
+        failed = False
+        try:
+            async for chunk in iterate_in_threadpool(generator):
+                if chunk.get("type") == "text":
+                    text_parts.append(chunk.get("content", ""))
+                elif chunk.get("type") == "error":
+                    failed = True
+                await self._send(stream_id, chunk)
+
+            if store and not failed:
+                reply = Message(role="assistant", content="".join(text_parts))
+                self._store_history(
+                    conversation_id,
+                    request.messages + [reply],
+                    size + _message_size([reply]),
+                )
+            await self._send(stream_id, {"type": "done"})
+        except asyncio.CancelledError:
+            # 任务已被取消，不能再等待队列
+            if not self._send_queue.full():
+                self._send_queue.put_nowait({"stream_id": stream_id, "type": "cancelled"})
+            raise
+        except Exception as e:
+            logger.error(f"WebSocket stream {stream_id} failed: {e}")
+            await self._reject(stream_id, str(e))
+        finally:
+            # 关闭生成器以释放上游连接
+            try:
+                generator.close()
+            except ValueError:
+                pass
+            self._streams.pop(stream_id, None)
+            self._active.pop(conversation_id, None)
@@ -0,0 +1,245 @@
+"""媒体预处理服务 - 图片缩放重编码、音频转码"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 未安装时图片原样透传
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_MIME_TYPES = {
+    "WEBP": "image/webp",
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+}
+
+IMAGE_FORMAT_ALIASES = {
+    "JPG": "JPEG",
+}
+
+# 浏览器上报的音频子类型 -> input_audio.format
+AUDIO_SUBTYPE_ALIASES = {
+    "mpeg": "mp3",
+    "mp3": "mp3",
+    "wav": "wav",
+    "x-wav": "wav",
+    "wave": "wav",
+}
+
+
+def resolve_image_format(image_format: str) -> str:
+    """规范化图片编码格式，不支持时抛出 ValueError"""
+    image_format = image_format.upper()
+    image_format = IMAGE_FORMAT_ALIASES.get(image_format, image_format)
+    if image_format not in IMAGE_MIME_TYPES:
+        raise ValueError(
+            f"Unsupported IMAGE_FORMAT: {image_format}, "
+            f"expected one of {', '.join(IMAGE_MIME_TYPES)}"
+        )
+    return image_format
+
+
+def _process_image(
+    data: bytes, max_dimension: int, image_format: str, quality: int
+) -> Optional[Tuple[bytes, str, bool]]:
+    """缩放并重编码图片（在子进程中运行），返回 (内容, MIME 类型, 是否缩放)，无需处理时返回 None"""
+    with Image.open(BytesIO(data)) as img:
+        # 动图重编码会丢帧，保持原样
+        if getattr(img, "is_animated", False):
+            return None
+
+        # 手机照片的方向信息在 EXIF 里，重编码会丢掉 EXIF，所以先转正
+        img = ImageOps.exif_transpose(img)
+        resized = max(img.size) > max_dimension
+        if resized:
+            img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        has_alpha = img.mode in ("RGBA", "LA") or (
+            img.mode == "P" and "transparency" in img.info
+        )
+        if has_alpha and image_format != "JPEG":
+            img = img.convert("RGBA")
+        else:
+            img = img.convert("RGB")
+
+        output = BytesIO()
+        img.save(output, format=image_format, quality=quality)
+        return output.getvalue(), IMAGE_MIME_TYPES[image_format], resized
+
+
+def _transcode_audio(data: bytes, audio_format: str) -> Optional[bytes]:
+    """使用 ffmpeg 转码音频（在子进程中运行），ffmpeg 不可用或失败时返回 None"""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+
+    # m4a 等容器的索引可能在文件末尾，无法从管道读取，先落盘
+    with tempfile.NamedTemporaryFile(delete=False) as source:
+        source.write(data)
+    try:
+        proc = subprocess.run(
+            [
+                ffmpeg, "-hide_banner", "-loglevel", "error",
+                "-i", source.name, "-vn", "-f", audio_format, "pipe:1",
+            ],
+            capture_output=True,
+            timeout=120,
+        )
+    finally:
+        os.unlink(source.name)
+
+    if proc.returncode != 0 or not proc.stdout:
+        return None
+    return proc.stdout
+
+
+class MediaProcessor:
+    """上传媒体预处理，CPU 密集的工作放到进程池中执行，结果按内容哈希+目标配置缓存"""
+
+    def __init__(self):
+        # 启动时校验配置，避免每张图片都在子进程中失败
+        self.image_format = resolve_image_format(settings.IMAGE_FORMAT)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[Tuple, Tuple[bytes, str]]" = OrderedDict()
+        self._cache_bytes = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """延迟创建进程池"""
+        if self._executor is None:
+            # 使用 spawn 而不是 fork：服务进程中有事件循环和线程池线程，
+            # fork 时它们持有的锁会被复制到子进程，可能导致死锁
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.MEDIA_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def image_max_dimension(self, model: Optional[str] = None) -> int:
+        """获取模型对应的图片最长边限制"""
+        if model:
+            for prefix, dimension in settings.MODEL_IMAGE_MAX_DIMENSIONS.items():
+                if model.startswith(prefix):
+                    return dimension
+        return settings.IMAGE_MAX_DIMENSION
+
+    def _cache_get(self, key: Tuple) -> Optional[Tuple[bytes, str]]:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        return None
+
+    def _cache_put(self, key: Tuple, value: Tuple[bytes, str]):
+        """写入缓存，超出条数或总字节数限制时淘汰最久未使用的条目"""
+        size = len(value[0])
+        # 单个结果超过总限制时不缓存
+        if size > settings.MEDIA_CACHE_MAX_BYTES:
+            return
+        if key in self._cache:
+            self._cache_bytes -= len(self._cache.pop(key)[0])
+        self._cache[key] = value
+        self._cache_bytes += size
+        while (
+            len(self._cache) > settings.MEDIA_CACHE_SIZE
+            or self._cache_bytes > settings.MEDIA_CACHE_MAX_BYTES
+        ):
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted[0])
+
+    async def _run(self, func, *args):
+        """在进程池中执行，失败时返回 None 由调用方回退到原始内容"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        except BrokenProcessPool:
+            logger.warning("Media process pool is broken, recreating it")
+            self.shutdown()
+        except Exception as e:
+            logger.warning(f"Media preprocessing failed: {e}")
+        return None
+
+    async def process(
+        self,
+        content: bytes,
+        content_type: str,
+        model: Optional[str] = None,
+        audio_format: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        预处理上传的媒体文件
+
+        Args:
+            content: 原始文件内容
+            content_type: MIME 类型
+            model: 目标模型ID，用于确定图片尺寸上限
+            audio_format: 音频目标格式 (input_audio.format)，默认使用配置值
+
+        Returns:
+            dict: {"content": bytes, "content_type": str, "cached": bool}
+        """
+        if content_type.startswith("image/") and Image is not None:
+            profile = (
+                "image",
+                self.image_max_dimension(model),
+                self.image_format,
+                settings.IMAGE_QUALITY,
+            )
+            func = _process_image
+        elif content_type.startswith("audio/"):
+            target = (audio_format or settings.AUDIO_FORMAT).lower()
+            subtype = content_type.split("/", 1)[1].split(";")[0]
+            # 格式已符合要求时只需修正 MIME 类型
+            if AUDIO_SUBTYPE_ALIASES.get(subtype) == target:
+                return {"content": content, "content_type": f"audio/{target}", "cached": False}
+            profile = ("audio", target)
+            func = _transcode_audio
+        else:
+            return {"content": content, "content_type": content_type, "cached": False}
+
+        key = (hashlib.sha256(content).hexdigest(),) + profile
+        cached = self._cache_get(key)
+        if cached is not None:
+            return {"content": cached[0], "content_type": cached[1], "cached": True}
+
+        if profile[0] == "image":
+            result = await self._run(func, content, *profile[1:])
+            if result is None:
+                return {"content": content, "content_type": content_type, "cached": False}
+            # 未缩放且重编码后反而更大时保留原图；缩放过的图片必须使用新结果
+            if not result[2] and len(result[0]) >= len(content):
+                result = (content, content_type)
+            else:
+                result = result[:2]
+        else:
+            data = await self._run(func, content, profile[1])
+            if data is None:
+                return {"content": content, "content_type": content_type, "cached": False}
+            result = (data, f"audio/{profile[1]}")
+
+        self._cache_put(key, result)
+        return {"content": result[0], "content_type": result[1], "cached": False}
+
+
+# 全局服务实例
+media_processor = MediaProcessor()
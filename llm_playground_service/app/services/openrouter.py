@@ -1,11 +1,13 @@
 """OpenRouter 服务封装 - 使用 OpenAI SDK"""
 from openai import OpenAI
-from typing import AsyncGenerator, List, Dict, Any, Optional
+from typing import AsyncGenerator, List, Dict, Any, Optional, Tuple
 import json
 import base64
+import time
 
 from app.config import settings
-from app.schemas.chat import Message, ContentItem
+from app.schemas.chat import ChatRequest, Message, ContentItem
+from app.services.prompt_cache import apply_cache_control, prompt_cache_stats, supports_cache_control
 
 
 class OpenRouterService:
@@ -23,6 +25,10 @@ class OpenRouterService:
             api_key=settings.OPENROUTER_API_KEY,
             default_headers=default_headers,
         )
+        # 模型目录缓存
+        self._models_cache: List[Dict[str, Any]] = []
+        # 尚未尝试获取时为 None（monotonic 从开机计时，不能用 0 表示）
+        self._models_fetched_at: Optional[float] = None
     
     def _convert_message(self, message: Message) -> Dict[str, Any]:
         """转换消息格式"""
@@ -45,6 +51,31 @@ class OpenRouterService:
         
         return msg
     
+    def _prepare_messages(self, model: str, messages: List[Message]) -> Tuple[List[Dict[str, Any]], int]:
+        """转换消息，并为支持提示词缓存的模型添加缓存断点"""
+        converted_messages = [self._convert_message(msg) for msg in messages]
+        breakpoints = 0
+        # 只读取已加载的目录，不在请求路径上访问 /models
+        if settings.PROMPT_CACHE_ENABLED and supports_cache_control(self.get_model(model, fetch=False)):
+            breakpoints = apply_cache_control(converted_messages)
+        return converted_messages, breakpoints
+    
+    def _build_extra_body(self, modalities: Optional[List[str]] = None) -> Dict[str, Any]:
+        """构建 OpenRouter 扩展参数"""
+        # 让 OpenRouter 在 usage 中返回缓存 token 数和费用
+        extra_body = {"usage": {"include": True}}
+        if modalities:
+            extra_body["modalities"] = modalities
+        return extra_body
+    
+    def _record_usage(self, model: str, usage, ttft: Optional[float], breakpoints: int):
+        """记录上游返回的用量（含缓存 token 数）"""
+        if usage is None:
+            return
+        if hasattr(usage, "model_dump"):
+            usage = usage.model_dump()
+        prompt_cache_stats.record(model, usage, ttft=ttft, breakpoints=breakpoints)
+    
     def _extract_images_from_content(self, content) -> List[str]:
         """从消息内容中提取图片URL"""
         images = []
@@ -108,7 +139,7 @@ class OpenRouterService:
         Yields:
             dict: 流式响应数据
         """
-        converted_messages = [self._convert_message(msg) for msg in messages]
+        converted_messages, breakpoints = self._prepare_messages(model, messages)
         
         # 判断是否是图片生成模型
         is_image_gen = self._is_image_generation_model(model, modalities)
@@ -118,6 +149,7 @@ class OpenRouterService:
             "model": model,
             "messages": converted_messages,
             "stream": True,
+            "stream_options": {"include_usage": True},
         }
         
         # 对于非图片生成模型，添加文本生成相关参数
@@ -128,19 +160,28 @@ class OpenRouterService:
             request_params["frequency_penalty"] = frequency_penalty
             request_params["presence_penalty"] = presence_penalty
         
-        # 添加多模态输出配置
-        if modalities:
-            request_params["extra_body"] = {"modalities": modalities}
+        # 添加多模态输出配置和用量统计
+        request_params["extra_body"] = self._build_extra_body(modalities)
         
         try:
+            start = time.monotonic()
+            ttft = None
+            usage = None
             response = self.client.chat.completions.create(**request_params)
             
             for chunk in response:
+                # 最后一个 chunk 携带 usage
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                
                 # 处理文本内容
                 if chunk.choices and len(chunk.choices) > 0:
                     choice = chunk.choices[0]
                     delta = choice.delta
                     
+                    if ttft is None and delta and delta.content:
+                        ttft = time.monotonic() - start
+                    
                     # 文本内容
                     if delta and delta.content:
                         # 检查content是否包含图片
@@ -195,10 +236,31 @@ class OpenRouterService:
                                 yield {"type": "image", "url": url}
                         elif isinstance(img, str):
                             yield {"type": "image", "url": img}
+            
+            self._record_usage(model, usage, ttft, breakpoints)
                             
         except Exception as e:
             yield {"type": "error", "content": str(e)}
     
+    def chat_stream_request(self, request: ChatRequest):
+        """
+        按聊天请求进行流式聊天，未提供的超参数使用默认值
+        
+        Yields:
+            dict: 流式响应数据，格式同 chat_stream
+        """
+        params = request.hyper_params
+        return self.chat_stream(
+            model=request.model,
+            messages=request.messages,
+            temperature=params.temperature if params else 0.7,
+            max_tokens=params.max_tokens if params else 4096,
+            top_p=params.top_p if params else 1.0,
+            frequency_penalty=params.frequency_penalty if params else 0.0,
+            presence_penalty=params.presence_penalty if params else 0.0,
+            modalities=request.modalities,
+        )
+    
     def chat_completion(
         self,
         model: str,
@@ -210,7 +272,7 @@ class OpenRouterService:
         """
         非流式聊天完成 - 用于图片生成等场景
         """
-        converted_messages = [self._convert_message(msg) for msg in messages]
+        converted_messages, breakpoints = self._prepare_messages(model, messages)
         
         # 判断是否是图片生成模型
         is_image_gen = self._is_image_generation_model(model, modalities)
@@ -225,11 +287,11 @@ class OpenRouterService:
             request_params["temperature"] = temperature
             request_params["max_tokens"] = max_tokens
         
-        if modalities:
-            request_params["extra_body"] = {"modalities": modalities}
+        request_params["extra_body"] = self._build_extra_body(modalities)
         
         try:
             response = self.client.chat.completions.create(**request_params)
+            self._record_usage(model, getattr(response, "usage", None), None, breakpoints)
             
             result = {
                 "text": "",
@@ -298,9 +360,17 @@ class OpenRouterService:
             return {"error": str(e)}
     
     def get_models(self) -> List[Dict[str, Any]]:
-        """获取可用模型列表"""
+        """获取可用模型列表（按 MODELS_CACHE_TTL 缓存）"""
+        if (
+            self._models_fetched_at is not None
+            and time.monotonic() - self._models_fetched_at < settings.MODELS_CACHE_TTL
+        ):
+            return self._models_cache
         try:
-            response = self.client.models.list()
+            response = self.client.with_options(
+                timeout=settings.MODELS_FETCH_TIMEOUT,
+                max_retries=0,
+            ).models.list()
             models = []
             for model in response.data:
                 model_info = {
@@ -312,13 +382,27 @@ class OpenRouterService:
                 if hasattr(model, "model_extra") and model.model_extra:
                     model_info.update(model.model_extra)
                 models.append(model_info)
+            self._models_cache = models
+            self._models_fetched_at = time.monotonic()
             return models
         except Exception as e:
             # 记录错误以便调试
             import logging
             logger = logging.getLogger(__name__)
             logger.error(f"Failed to fetch models from OpenRouter: {e}")
-            return []
+            # 刷新失败时继续使用旧的目录，并在 MODELS_RETRY_INTERVAL 秒后再重试
+            self._models_fetched_at = (
+                time.monotonic() - settings.MODELS_CACHE_TTL + settings.MODELS_RETRY_INTERVAL
+            )
+            return self._models_cache
+    
+    def get_model(self, model_id: str, fetch: bool = True) -> Optional[Dict[str, Any]]:
+        """从模型目录中查找单个模型，fetch 为 False 时只查找已加载的目录"""
+        models = self.get_models() if fetch else self._models_cache
+        for model in models:
+            if model.get("id") == model_id:
+                return model
+        return None
 
 
 # 全局服务实例
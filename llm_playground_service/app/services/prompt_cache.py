@@ -0,0 +1,205 @@
+"""提示词前缀缓存 - 为支持的模型添加 cache_control 断点，并统计缓存命中情况"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Anthropic 每个请求最多 4 个缓存断点
+MAX_BREAKPOINTS = 4
+
+# 图片按固定 token 数估算
+IMAGE_TOKEN_ESTIMATE = 800
+
+# 可以携带 cache_control 的内容块类型
+CACHEABLE_PART_TYPES = ("text", "image_url")
+
+
+def supports_cache_control(model_info: Optional[Dict[str, Any]]) -> bool:
+    """
+    判断模型是否需要显式的缓存断点
+
+    OpenRouter 目录中带 input_cache_write 价格的模型（Anthropic、Gemini）需要
+    cache_control 断点；只有 input_cache_read 的模型（OpenAI、DeepSeek 等）会自动缓存。
+    """
+    if not model_info:
+        return False
+    pricing = model_info.get("pricing") or {}
+    try:
+        return float(pricing.get("input_cache_write") or 0) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+def _estimate_tokens(part: Dict[str, Any]) -> int:
+    """粗略估算内容块的 token 数"""
+    if part.get("type") == "text":
+        return len(part.get("text", "")) // 4
+    if part.get("type") in ("image_url", "image"):
+        return IMAGE_TOKEN_ESTIMATE
+    return 0
+
+
+def apply_cache_control(
+    messages: List[Dict[str, Any]],
+    min_tokens: Optional[int] = None,
+    document_tokens: Optional[int] = None,
+) -> int:
+    """
+    在稳定的前缀末尾添加 cache_control 断点（原地修改已转换的消息）
+
+    前端按固定大块裁剪历史（见 App.tsx 的 getHistoryStart），同一会话相邻请求的
+    前缀在多数轮次中保持不变，因此以下位置之前的内容可以在后续轮次中复用：
+    - 最后一条消息：下一轮请求以它为前缀
+    - 上一条用户消息：与上一轮请求写入的缓存对齐，保证命中
+    - 系统提示词
+    - 大段文本（附加的文档）
+
+    Args:
+        messages: 已转换的 OpenAI 格式消息
+        min_tokens: 前缀最少 token 数，低于此值供应商不会缓存
+        document_tokens: 超过此 token 数的文本块视为文档
+
+    Returns:
+        int: 添加的断点数量
+    """
+    min_tokens = settings.PROMPT_CACHE_MIN_TOKENS if min_tokens is None else min_tokens
+    document_tokens = (
+        settings.PROMPT_CACHE_DOCUMENT_TOKENS if document_tokens is None else document_tokens
+    )
+
+    # 记录每个可缓存内容块结束时的累计 token 数
+    prefix_tokens: Dict[Tuple[int, int], int] = {}
+    documents: List[Tuple[int, Tuple[int, int]]] = []
+    total = 0
+    for i, msg in enumerate(messages):
+        content = msg.get("content")
+        parts = [{"type": "text", "text": content}] if isinstance(content, str) else content or []
+        for j, part in enumerate(parts):
+            if not isinstance(part, dict):
+                continue
+            tokens = _estimate_tokens(part)
+            total += tokens
+            if part.get("type") in CACHEABLE_PART_TYPES:
+                prefix_tokens[(i, j)] = total
+            if part.get("type") == "text" and tokens >= document_tokens:
+                documents.append((tokens, (i, j)))
+
+    def message_end(index: int) -> Optional[Tuple[int, int]]:
+        """消息中最后一个可缓存内容块的位置"""
+        ends = [pos for pos in prefix_tokens if pos[0] == index]
+        return max(ends) if ends else None
+
+    # 按优先级收集候选断点
+    candidates: List[Optional[Tuple[int, int]]] = [message_end(len(messages) - 1)]
+    user_indices = [i for i, msg in enumerate(messages) if msg.get("role") == "user"]
+    if len(user_indices) >= 2:
+        candidates.append(message_end(user_indices[-2]))
+    system_indices = [i for i, msg in enumerate(messages) if msg.get("role") == "system"]
+    if system_indices:
+        candidates.append(message_end(system_indices[-1]))
+    candidates.extend(pos for _, pos in sorted(documents, reverse=True))
+
+    breakpoints: List[Tuple[int, int]] = []
+    for pos in candidates:
+        if pos is None or pos in breakpoints or prefix_tokens[pos] < min_tokens:
+            continue
+        breakpoints.append(pos)
+        if len(breakpoints) >= MAX_BREAKPOINTS:
+            break
+
+    for i, j in breakpoints:
+        msg = messages[i]
+        if isinstance(msg["content"], str):
+            msg["content"] = [{"type": "text", "text": msg["content"]}]
+        # 不修改调用方传入的内容块
+        msg["content"] = list(msg["content"])
+        msg["content"][j] = {**msg["content"][j], "cache_control": CACHE_CONTROL}
+
+    return len(breakpoints)
+
+
+class PromptCacheStats:
+    """按模型统计上游返回的缓存 token 数和首 token 延迟"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def record(
+        self,
+        model: str,
+        usage: Dict[str, Any],
+        ttft: Optional[float] = None,
+        breakpoints: int = 0,
+    ):
+        """
+        记录一次请求的用量
+
+        Args:
+            model: 模型ID
+            usage: 上游返回的 usage 字段
+            ttft: 首 token 延迟（秒），非流式请求为 None
+            breakpoints: 本次请求添加的缓存断点数量
+        """
+        details = usage.get("prompt_tokens_details") or {}
+        cached_tokens = details.get("cached_tokens") or 0
+
+        with self._lock:
+            stats = self._stats.setdefault(model, {
+                "requests": 0,
+                "cache_hinted_requests": 0,
+                "cache_hit_requests": 0,
+                "prompt_tokens": 0,
+                "cached_tokens": 0,
+                "cache_write_tokens": 0,
+                "cost": 0.0,
+                "ttft_hit_total": 0.0,
+                "ttft_hit_count": 0,
+                "ttft_miss_total": 0.0,
+                "ttft_miss_count": 0,
+            })
+            stats["requests"] += 1
+            stats["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            stats["cached_tokens"] += cached_tokens
+            stats["cache_write_tokens"] += details.get("cache_write_tokens") or 0
+            stats["cost"] += usage.get("cost") or 0.0
+            if breakpoints:
+                stats["cache_hinted_requests"] += 1
+            if cached_tokens:
+                stats["cache_hit_requests"] += 1
+            if ttft is not None:
+                key = "hit" if cached_tokens else "miss"
+                stats[f"ttft_{key}_total"] += ttft
+                stats[f"ttft_{key}_count"] += 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """按模型汇总缓存命中率和平均首 token 延迟"""
+        result = {}
+        with self._lock:
+            for model, stats in self._stats.items():
+                prompt_tokens = stats["prompt_tokens"]
+                result[model] = {
+                    "requests": stats["requests"],
+                    "cache_hinted_requests": stats["cache_hinted_requests"],
+                    "cache_hit_requests": stats["cache_hit_requests"],
+                    "prompt_tokens": prompt_tokens,
+                    "cached_tokens": stats["cached_tokens"],
+                    "cache_write_tokens": stats["cache_write_tokens"],
+                    "cached_ratio": stats["cached_tokens"] / prompt_tokens if prompt_tokens else 0.0,
+                    "cost": stats["cost"],
+                    "avg_ttft_hit": (
+                        stats["ttft_hit_total"] / stats["ttft_hit_count"]
+                        if stats["ttft_hit_count"] else None
+                    ),
+                    "avg_ttft_miss": (
+                        stats["ttft_miss_total"] / stats["ttft_miss_count"]
+                        if stats["ttft_miss_count"] else None
+                    ),
+                }
+        return result
+
+
+# 全局统计实例
+prompt_cache_stats = PromptCacheStats()
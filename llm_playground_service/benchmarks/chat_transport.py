@@ -0,0 +1,187 @@
+"""
+聊天传输基准测试 - 比较 SSE (POST /api/chat/stream) 与 WebSocket (/api/chat/ws) 的每轮开销
+
+上游用固定的假生成器代替，只测量传输层本身：连接、中间件、JSON 解析、请求校验和事件转发。
+两种传输都按前端的方式构造每轮消息：历史按 App.tsx 的 getHistoryStart 成块裁剪，
+WebSocket 客户端与 api.ts 的 ChatSocket 一样，只在服务端历史是本轮消息的前缀时增量发送。
+
+运行 (需要额外安装 httpx):
+    cd llm_playground_service
+    python -m benchmarks.chat_transport --turns 20 --rounds 5
+"""
+import argparse
+import json
+import socket
+import statistics
+import threading
+import time
+
+import httpx
+import uvicorn
+from websockets.sync.client import connect
+
+from app.main import app
+from app.services.openrouter import openrouter_service
+
+ORIGIN = "http://localhost:5173"
+# 与 App.tsx 保持一致
+HISTORY_WINDOW = 10
+HISTORY_TRIM = 5
+CHUNKS_PER_REPLY = 20
+REPLY_CHUNK = "token "
+
+
+def fake_chat_stream_request(request):
+    """不访问上游，直接返回固定的文本块"""
+    for _ in range(CHUNKS_PER_REPLY):
+        yield {"type": "text", "content": REPLY_CHUNK}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def system_prompt(tokens: int) -> dict:
+    return {"role": "system", "content": "You are a helpful assistant. " * (tokens // 6)}
+
+
+def history_start(length: int) -> int:
+    """对应 App.tsx 的 getHistoryStart"""
+    if length <= HISTORY_WINDOW:
+        return 0
+    return -(-(length - HISTORY_WINDOW) // HISTORY_TRIM) * HISTORY_TRIM
+
+
+def build_messages(system: dict, history: list, turn: int) -> list:
+    """按前端的方式构造本轮请求消息"""
+    return [system] + history[history_start(len(history)):] + [
+        {"role": "user", "content": f"question {turn}"}
+    ]
+
+
+def run_sse(base_url: str, turns: int, prompt_tokens: int):
+    """每轮 POST 窗口内的完整历史，返回 (首事件延迟, 整轮耗时) 列表"""
+    results = []
+    system = system_prompt(prompt_tokens)
+    history = []
+    with httpx.Client(base_url=base_url, headers={"Origin": ORIGIN}) as client:
+        for turn in range(turns):
+            messages = build_messages(system, history, turn)
+            start = time.perf_counter()
+            first = None
+            reply = []
+            with client.stream("POST", "/api/chat/stream", json={"model": "bench", "messages": messages}) as response:
+                for line in response.iter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[6:]
+                    if first is None:
+                        first = time.perf_counter() - start
+                    if data == "[DONE]":
+                        break
+                    reply.append(json.loads(data).get("content", ""))
+            results.append((first, time.perf_counter() - start))
+            history += [messages[-1], {"role": "assistant", "content": "".join(reply)}]
+    return results
+
+
+def run_ws(ws_url: str, turns: int, prompt_tokens: int, resets: list):
+    """
+    在同一连接上按前缀同步发送消息，返回 (首事件延迟, 整轮耗时) 列表
+
+    resets 中追加每轮是否发送了完整历史（reset）
+    """
+    results = []
+    system = system_prompt(prompt_tokens)
+    history = []
+    synced = []
+    with connect(ws_url, origin=ORIGIN) as ws:
+        for turn in range(turns):
+            messages = build_messages(system, history, turn)
+            is_prefix = messages[:len(synced)] == synced
+            resets.append(not is_prefix)
+            stream_id = f"s{turn}"
+            start = time.perf_counter()
+            first = None
+            reply = []
+            ws.send(json.dumps({
+                "type": "chat",
+                "stream_id": stream_id,
+                "conversation_id": "main",
+                "model": "bench",
+                "messages": messages[len(synced):] if is_prefix else messages,
+                "reset": not is_prefix,
+                "history_length": len(synced) if is_prefix else 0,
+            }))
+            while True:
+                event = json.loads(ws.recv())
+                if first is None:
+                    first = time.perf_counter() - start
+                if event["stream_id"] != stream_id:
+                    continue
+                if event["type"] == "text":
+                    reply.append(event["content"])
+                elif event["type"] in ("done", "resync"):
+                    break
+            results.append((first, time.perf_counter() - start))
+            assistant = {"role": "assistant", "content": "".join(reply)}
+            synced = messages + [assistant]
+            history += [messages[-1], assistant]
+    return results
+
+
+def summarize(name: str, samples):
+    firsts = [s[0] * 1000 for s in samples]
+    totals = [s[1] * 1000 for s in samples]
+    print(
+        f"{name:<4} first event p50 {statistics.median(firsts):7.2f} ms  "
+        f"p95 {statistics.quantiles(firsts, n=20)[-1]:7.2f} ms  |  "
+        f"turn p50 {statistics.median(totals):7.2f} ms  "
+        f"p95 {statistics.quantiles(totals, n=20)[-1]:7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20, help="每个会话的轮数")
+    parser.add_argument("--rounds", type=int, default=5, help="会话重复次数")
+    parser.add_argument("--prompt-tokens", type=int, default=2000, help="系统提示词的近似 token 数")
+    args = parser.parse_args()
+
+    openrouter_service.chat_stream_request = fake_chat_stream_request
+    port = free_port()
+    server = start_server(port)
+
+    try:
+        # 预热
+        run_sse(f"http://127.0.0.1:{port}", 2, args.prompt_tokens)
+        run_ws(f"ws://127.0.0.1:{port}/api/chat/ws", 2, args.prompt_tokens, [])
+
+        sse, ws, resets = [], [], []
+        for _ in range(args.rounds):
+            sse += run_sse(f"http://127.0.0.1:{port}", args.turns, args.prompt_tokens)
+            ws += run_ws(f"ws://127.0.0.1:{port}/api/chat/ws", args.turns, args.prompt_tokens, resets)
+
+        print(
+            f"{args.rounds} rounds x {args.turns} turns, ~{args.prompt_tokens} token system prompt, "
+            f"history window {HISTORY_WINDOW}/{HISTORY_TRIM}"
+        )
+        summarize("SSE", sse)
+        summarize("WS", ws)
+        print(f"WS turns sent as full history (reset): {sum(resets)}/{len(resets)}")
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
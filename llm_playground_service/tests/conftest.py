@@ -0,0 +1,5 @@
+"""测试公共配置"""
+import os
+
+# OpenAI SDK 要求 api_key 非空，需在导入 app 之前设置
+os.environ.setdefault("OPENROUTER_API_KEY", "test-key")
@@ -0,0 +1,171 @@
+"""WebSocket 聊天协议测试"""
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.config import settings
+from app.main import app
+from app.services.openrouter import openrouter_service
+
+ORIGIN = "http://localhost:5173"
+
+
+class FakeUpstream:
+    """代替 chat_stream_request，记录收到的请求，可以阻塞直到放行"""
+
+    def __init__(self):
+        self.requests = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, request):
+        self.requests.append(request)
+        return self._stream()
+
+    def _stream(self):
+        self.gate.wait(timeout=5)
+        yield {"type": "text", "content": "reply"}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = FakeUpstream()
+    monkeypatch.setattr(openrouter_service, "chat_stream_request", fake)
+    yield fake
+    # 放行仍在等待的生成，避免线程池阻塞
+    fake.gate.set()
+
+
+@pytest.fixture
+def ws(upstream):
+    # 不进入 TestClient 上下文，避免 lifespan 访问网络
+    with TestClient(app).websocket_connect("/api/chat/ws", headers={"origin": ORIGIN}) as websocket:
+        yield websocket
+
+
+def chat(stream_id, content="hi", **fields):
+    return {
+        "type": "chat",
+        "stream_id": stream_id,
+        "model": "test/model",
+        "messages": [{"role": "user", "content": content}],
+        **fields,
+    }
+
+
+def receive_until_end(websocket, stream_id):
+    """读取事件直到 stream_id 的结束事件，返回该流的事件类型列表"""
+    events = []
+    while True:
+        event = websocket.receive_json()
+        if event["stream_id"] != stream_id:
+            continue
+        events.append(event["type"])
+        if event["type"] in ("done", "cancelled", "resync"):
+            return events
+
+
+def test_completed_stream_ends_with_done(ws):
+    ws.send_json(chat("s1"))
+
+    assert receive_until_end(ws, "s1") == ["text", "done"]
+
+
+def test_invalid_frame_is_rejected_with_its_stream_id(ws):
+    ws.send_json({"type": "chat", "stream_id": "s1", "model": "test/model", "messages": "oops"})
+
+    assert receive_until_end(ws, "s1") == ["error", "done"]
+
+
+def test_duplicate_stream_id_is_rejected(ws, upstream):
+    upstream.gate.clear()
+    ws.send_json(chat("s1"))
+    ws.send_json(chat("s1", conversation_id="other"))
+
+    assert receive_until_end(ws, "s1") == ["error", "done"]
+    upstream.gate.set()
+    assert receive_until_end(ws, "s1") == ["text", "done"]
+
+
+def test_streams_over_limit_are_rejected(ws, upstream, monkeypatch):
+    monkeypatch.setattr(settings, "WS_MAX_STREAMS", 1)
+    upstream.gate.clear()
+    ws.send_json(chat("s1", conversation_id="a"))
+    ws.send_json(chat("s2", conversation_id="b"))
+
+    assert receive_until_end(ws, "s2") == ["error", "done"]
+    upstream.gate.set()
+    assert receive_until_end(ws, "s1") == ["text", "done"]
+
+
+def test_busy_conversation_is_rejected(ws, upstream):
+    upstream.gate.clear()
+    ws.send_json(chat("s1"))
+    ws.send_json(chat("s2"))
+
+    assert receive_until_end(ws, "s2") == ["error", "done"]
+    upstream.gate.set()
+    assert receive_until_end(ws, "s1") == ["text", "done"]
+
+
+def test_cancel_ends_stream_with_cancelled(ws, upstream):
+    upstream.gate.clear()
+    ws.send_json(chat("s1"))
+    ws.send_json({"type": "cancel", "stream_id": "s1"})
+    # 等取消生效后再放行上游
+    time.sleep(0.2)
+    upstream.gate.set()
+
+    assert receive_until_end(ws, "s1") == ["cancelled"]
+
+
+def test_history_is_sent_incrementally(ws, upstream):
+    ws.send_json(chat("s1", "q1", reset=True, history_length=0))
+    receive_until_end(ws, "s1")
+    ws.send_json(chat("s2", "q2", history_length=2))
+    receive_until_end(ws, "s2")
+
+    contents = [m.content for m in upstream.requests[-1].messages]
+    assert contents == ["q1", "reply", "q2"]
+
+
+def test_history_length_mismatch_requests_resync(ws, upstream):
+    ws.send_json(chat("s1", history_length=4))
+
+    assert receive_until_end(ws, "s1") == ["resync"]
+    assert upstream.requests == []
+
+
+def test_least_recently_used_conversation_is_evicted(ws, monkeypatch):
+    monkeypatch.setattr(settings, "WS_MAX_CONVERSATIONS", 1)
+    ws.send_json(chat("s1", conversation_id="a", reset=True))
+    receive_until_end(ws, "s1")
+    ws.send_json(chat("s2", conversation_id="b", reset=True))
+    receive_until_end(ws, "s2")
+
+    ws.send_json(chat("s3", conversation_id="a", history_length=2))
+    assert receive_until_end(ws, "s3") == ["resync"]
+
+
+def test_unstored_conversation_keeps_history(ws, monkeypatch):
+    monkeypatch.setattr(settings, "WS_MAX_CONVERSATIONS", 1)
+    ws.send_json(chat("s1", conversation_id="main", reset=True))
+    receive_until_end(ws, "s1")
+    ws.send_json(chat("s2", conversation_id="s2", reset=True, store=False))
+    receive_until_end(ws, "s2")
+
+    ws.send_json(chat("s3", conversation_id="main", history_length=2))
+    assert receive_until_end(ws, "s3") == ["text", "done"]
+    ws.send_json(chat("s4", conversation_id="s2", history_length=2))
+    assert receive_until_end(ws, "s4") == ["resync"]
+
+
+def test_foreign_origin_is_rejected(upstream):
+    client = TestClient(app)
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/chat/ws", headers={"origin": "https://evil.example"}):
+            pass
@@ -0,0 +1,66 @@
+"""OpenRouter 模型目录缓存测试"""
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from app.config import settings
+from app.services.openrouter import OpenRouterService
+
+
+def make_service(list_models):
+    """创建使用假 /models 接口的服务"""
+    service = OpenRouterService()
+    client = Mock()
+    client.models.list.side_effect = list_models
+    service.client = Mock()
+    service.client.with_options.return_value = client
+    return service, client
+
+
+def models_response(*model_ids):
+    return SimpleNamespace(data=[
+        SimpleNamespace(id=model_id, owned_by=None, model_extra={}) for model_id in model_ids
+    ])
+
+
+def test_first_fetch_happens_shortly_after_boot():
+    service, client = make_service(lambda: models_response("anthropic/claude"))
+
+    # monotonic 从开机计时，开机不久时也必须真正获取目录
+    with patch("app.services.openrouter.time.monotonic", return_value=120.0):
+        models = service.get_models()
+
+    assert [m["id"] for m in models] == ["anthropic/claude"]
+    assert client.models.list.call_count == 1
+
+
+def test_catalog_is_cached_within_ttl():
+    service, client = make_service(lambda: models_response("anthropic/claude"))
+
+    with patch("app.services.openrouter.time.monotonic", return_value=1000.0):
+        service.get_models()
+        service.get_models()
+
+    assert client.models.list.call_count == 1
+
+
+def test_failed_fetch_is_retried_after_interval():
+    service, client = make_service(Mock(side_effect=RuntimeError("down")))
+
+    with patch("app.services.openrouter.time.monotonic", return_value=1000.0):
+        assert service.get_models() == []
+        assert service.get_models() == []
+    assert client.models.list.call_count == 1
+
+    with patch(
+        "app.services.openrouter.time.monotonic",
+        return_value=1000.0 + settings.MODELS_RETRY_INTERVAL,
+    ):
+        service.get_models()
+    assert client.models.list.call_count == 2
+
+
+def test_chat_lookup_does_not_fetch_catalog():
+    service, client = make_service(lambda: models_response("anthropic/claude"))
+
+    assert service.get_model("anthropic/claude", fetch=False) is None
+    assert client.models.list.call_count == 0
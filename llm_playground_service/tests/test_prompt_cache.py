@@ -0,0 +1,151 @@
+"""提示词缓存断点和统计测试"""
+import pytest
+
+from app.services.prompt_cache import (
+    CACHE_CONTROL,
+    MAX_BREAKPOINTS,
+    PromptCacheStats,
+    apply_cache_control,
+    supports_cache_control,
+)
+
+# 约 1000 token 的文本（按 4 字符/token 估算）
+LONG_TEXT = "x" * 4000
+
+
+def cached_positions(messages):
+    """返回带 cache_control 的 (消息下标, 内容块下标) 列表"""
+    positions = []
+    for i, msg in enumerate(messages):
+        if isinstance(msg["content"], list):
+            for j, part in enumerate(msg["content"]):
+                if part.get("cache_control") == CACHE_CONTROL:
+                    positions.append((i, j))
+    return positions
+
+
+class TestSupportsCacheControl:
+    def test_cache_write_pricing_requires_breakpoints(self):
+        assert supports_cache_control({"pricing": {"input_cache_write": "0.00000375"}})
+
+    def test_read_only_cache_pricing_is_automatic(self):
+        assert not supports_cache_control({"pricing": {"input_cache_read": "0.0000005"}})
+
+    @pytest.mark.parametrize("model_info", [None, {}, {"pricing": {"input_cache_write": "n/a"}}])
+    def test_missing_or_invalid_pricing(self, model_info):
+        assert not supports_cache_control(model_info)
+
+
+class TestApplyCacheControl:
+    def test_marks_system_previous_user_and_last_message(self):
+        messages = [
+            {"role": "system", "content": LONG_TEXT * 2},
+            {"role": "user", "content": "q1"},
+            {"role": "assistant", "content": "a1"},
+            {"role": "user", "content": "q2"},
+        ]
+
+        count = apply_cache_control(messages, min_tokens=1024, document_tokens=100000)
+
+        assert count == 3
+        assert cached_positions(messages) == [(0, 0), (1, 0), (3, 0)]
+        # 字符串内容被转换为文本块，原文保持不变
+        assert messages[3]["content"] == [{"type": "text", "text": "q2", "cache_control": CACHE_CONTROL}]
+
+    def test_skips_prefixes_below_min_tokens(self):
+        messages = [
+            {"role": "system", "content": "short"},
+            {"role": "user", "content": "hello"},
+        ]
+
+        assert apply_cache_control(messages, min_tokens=1024) == 0
+        assert messages[1]["content"] == "hello"
+
+    def test_marks_large_documents(self):
+        messages = [
+            {"role": "user", "content": [
+                {"type": "text", "text": LONG_TEXT * 3},
+                {"type": "text", "text": "summarise"},
+            ]},
+        ]
+
+        apply_cache_control(messages, min_tokens=1024, document_tokens=2048)
+
+        assert cached_positions(messages) == [(0, 0), (0, 1)]
+
+    def test_caps_breakpoints(self):
+        documents = [{"type": "text", "text": LONG_TEXT * 3} for _ in range(6)]
+        messages = [
+            {"role": "system", "content": LONG_TEXT},
+            {"role": "user", "content": documents},
+            {"role": "assistant", "content": "a1"},
+            {"role": "user", "content": "q2"},
+        ]
+
+        assert apply_cache_control(messages, min_tokens=1024, document_tokens=2048) == MAX_BREAKPOINTS
+        assert len(cached_positions(messages)) == MAX_BREAKPOINTS
+
+    def test_never_marks_audio_parts(self):
+        messages = [
+            {"role": "system", "content": LONG_TEXT * 2},
+            {"role": "user", "content": [
+                {"type": "text", "text": "transcribe"},
+                {"type": "input_audio", "input_audio": {"data": "AAAA", "format": "mp3"}},
+            ]},
+        ]
+
+        apply_cache_control(messages, min_tokens=1024)
+
+        assert (1, 0) in cached_positions(messages)
+        assert "cache_control" not in messages[1]["content"][1]
+
+    def test_does_not_mutate_caller_parts(self):
+        part = {"type": "text", "text": LONG_TEXT * 2}
+        messages = [{"role": "user", "content": [part]}]
+
+        apply_cache_control(messages, min_tokens=1024)
+
+        assert "cache_control" not in part
+        assert cached_positions(messages) == [(0, 0)]
+
+
+class TestPromptCacheStats:
+    def test_record_and_summary(self):
+        stats = PromptCacheStats()
+
+        stats.record(
+            "anthropic/claude",
+            {"prompt_tokens": 1000, "prompt_tokens_details": {"cached_tokens": 800, "cache_write_tokens": 0}, "cost": 0.01},
+            ttft=0.2,
+            breakpoints=2,
+        )
+        stats.record(
+            "anthropic/claude",
+            {"prompt_tokens": 1000, "prompt_tokens_details": {"cached_tokens": 0, "cache_write_tokens": 900}, "cost": 0.03},
+            ttft=0.6,
+            breakpoints=2,
+        )
+        stats.record("anthropic/claude", {"prompt_tokens": 500}, breakpoints=0)
+
+        summary = stats.summary()["anthropic/claude"]
+        assert summary["requests"] == 3
+        assert summary["cache_hinted_requests"] == 2
+        assert summary["cache_hit_requests"] == 1
+        assert summary["prompt_tokens"] == 2500
+        assert summary["cached_tokens"] == 800
+        assert summary["cache_write_tokens"] == 900
+        assert summary["cached_ratio"] == pytest.approx(0.32)
+        assert summary["cost"] == pytest.approx(0.04)
+        assert summary["avg_ttft_hit"] == pytest.approx(0.2)
+        assert summary["avg_ttft_miss"] == pytest.approx(0.6)
+
+    def test_handles_null_usage_details(self):
+        stats = PromptCacheStats()
+
+        stats.record("openai/gpt-4o", {"prompt_tokens": None, "prompt_tokens_details": None, "cost": None})
+
+        summary = stats.summary()["openai/gpt-4o"]
+        assert summary["prompt_tokens"] == 0
+        assert summary["cached_ratio"] == 0.0
+        assert summary["avg_ttft_hit"] is None
+        assert summary["avg_ttft_miss"] is None
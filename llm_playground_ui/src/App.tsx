@@ -28,6 +28,24 @@ const DEFAULT_HYPER_PARAMS: HyperParamsType = {
   presence_penalty: 0.0,
 };
 
+// 请求中最多携带的历史条数
+const HISTORY_WINDOW = 10;
+// 超出时一次丢弃的条数
+const HISTORY_TRIM = 5;
+
+/**
+ * 计算请求携带的历史起点
+ *
+ * 按 HISTORY_TRIM 成块丢弃而不是逐条滑动，使请求前缀在多轮之间保持不变，
+ * 供应商的提示词缓存和 WebSocket 增量发送都依赖于此。
+ */
+function getHistoryStart(length: number): number {
+  if (length <= HISTORY_WINDOW) {
+    return 0;
+  }
+  return Math.ceil((length - HISTORY_WINDOW) / HISTORY_TRIM) * HISTORY_TRIM;
+}
+
 export default function App() {
   // 状态管理
   const [selectedModel, setSelectedModel] = useState<ModelInfo | null>(null);
@@ -118,8 +136,8 @@ export default function App() {
       messages.push({ role: 'system', content: systemPrompt });
     }
 
-    // 历史消息（简化版，只取最近几条）
-    const recentHistory = chatHistory.slice(-10);
+    // 历史消息（成块裁剪，保持前缀稳定）
+    const recentHistory = chatHistory.slice(getHistoryStart(chatHistory.length));
     for (const item of recentHistory) {
       if (item.role === 'user') {
         messages.push({
@@ -330,6 +348,7 @@ export default function App() {
           <ChatInput 
             onSend={handleSend}
             capabilities={capabilities}
+            modelId={selectedModel?.id}
             isLoading={isStreaming}
             disabled={!selectedModel}
           />
@@ -17,6 +17,7 @@ import MediaPreview from './MediaPreview';
 interface ChatInputProps {
   onSend: (text: string, mediaFiles: MediaFile[]) => void;
   capabilities: ModelCapabilities;
+  modelId?: string;
   isLoading: boolean;
   disabled?: boolean;
 }
@@ -39,6 +40,7 @@ const ACCEPTED_TYPES: Record<InputType, string> = {
 export default function ChatInput({ 
   onSend, 
   capabilities, 
+  modelId,
   isLoading,
   disabled = false 
 }: ChatInputProps) {
@@ -77,7 +79,7 @@ export default function ChatInput({
         }
 
         // 上传文件
-        const result = await uploadFile(file);
+        const result = await uploadFile(file, modelId);
         
         const mediaFile: MediaFile = {
           id: `${Date.now()}-${Math.random().toString(36).slice(2)}`,
@@ -95,7 +97,7 @@ export default function ChatInput({
     } finally {
       setIsUploading(false);
     }
-  }, [capabilities.inputTypes]);
+  }, [capabilities.inputTypes, modelId]);
 
   // 处理拖放
   const handleDrop = useCallback((e: React.DragEvent) => {
@@ -10,6 +10,9 @@ import type {
 // 开发环境使用 vite proxy，生产环境使用环境变量
 const API_BASE = import.meta.env.VITE_API_BASE_URL || '/api';
 
+// 聊天传输方式：'sse'（默认）或 'ws'
+const CHAT_TRANSPORT = import.meta.env.VITE_CHAT_TRANSPORT || 'sse';
+
 /**
  * 获取模型列表（分类后的）
  */
@@ -50,9 +53,13 @@ export async function fetchModelInfo(modelId: string): Promise<ModelInfo> {
 /**
  * 上传文件
  */
-export async function uploadFile(file: File): Promise<UploadResponse> {
+export async function uploadFile(file: File, modelId?: string): Promise<UploadResponse> {
   const formData = new FormData();
   formData.append('file', file);
+  // 后端按模型的图片尺寸上限进行预处理
+  if (modelId) {
+    formData.append('model', modelId);
+  }
   
   const response = await fetch(`${API_BASE}/chat/upload`, {
     method: 'POST',
@@ -70,6 +77,17 @@ export async function uploadFile(file: File): Promise<UploadResponse> {
  * 流式聊天
  */
 export async function* chatStream(request: ChatRequest): AsyncGenerator<StreamChunk> {
+  if (CHAT_TRANSPORT === 'ws') {
+    yield* chatSocket.stream(request);
+    return;
+  }
+  yield* chatStreamSse(request);
+}
+
+/**
+ * 通过 SSE 接口流式聊天
+ */
+async function* chatStreamSse(request: ChatRequest): AsyncGenerator<StreamChunk> {
   const response = await fetch(`${API_BASE}/chat/stream`, {
     method: 'POST',
     headers: {
@@ -115,6 +133,190 @@ export async function* chatStream(request: ChatRequest): AsyncGenerator<StreamCh
   }
 }
 
+// WebSocket 服务端事件
+interface WsEvent {
+  stream_id: string;
+  type: StreamChunk['type'] | 'done' | 'cancelled' | 'resync';
+  content?: string;
+  url?: string;
+}
+
+function getWsUrl(): string {
+  const base = API_BASE.startsWith('http')
+    ? API_BASE.replace(/^http/, 'ws')
+    : `${window.location.protocol === 'https:' ? 'wss' : 'ws'}://${window.location.host}${API_BASE}`;
+  return `${base}/chat/ws`;
+}
+
+// 页面对话在服务端对应的会话
+const MAIN_CONVERSATION = 'main';
+
+// 单个 WebSocket 帧的上限，与 uvicorn 的 ws_max_size 默认值（16 MiB）一致。
+// 超过时服务端会直接关闭连接，因此改用 SSE 接口发送
+const WS_MAX_FRAME_BYTES = 16 * 1024 * 1024;
+
+/**
+ * WebSocket 聊天连接
+ *
+ * 整个页面共用一个连接，按 stream_id 区分并发的生成。
+ * 服务端保存对话历史，每轮只发送新增的消息；服务端历史不一致时（resync）重置后重发。
+ * 页面对话同时只有一个生成使用增量同步，其余并发的生成使用独立会话发送完整历史。
+ */
+class ChatSocket {
+  private socket: WebSocket | null = null;
+  private opening: Promise<WebSocket> | null = null;
+  private listeners = new Map<string, (event: WsEvent) => void>();
+  // 服务端保存的页面对话历史（序列化后），用于计算增量
+  private synced: string[] = [];
+  // 页面对话是否有生成正在进行
+  private mainBusy = false;
+  private nextId = 0;
+
+  private connect(): Promise<WebSocket> {
+    if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+      return Promise.resolve(this.socket);
+    }
+    if (!this.opening) {
+      this.opening = new Promise((resolve, reject) => {
+        const socket = new WebSocket(getWsUrl());
+        socket.onopen = () => {
+          this.socket = socket;
+          this.opening = null;
+          resolve(socket);
+        };
+        socket.onerror = () => {
+          this.opening = null;
+          reject(new Error('WebSocket connection failed'));
+        };
+        socket.onclose = () => {
+          this.socket = null;
+          // 新连接上没有服务端历史
+          this.synced = [];
+          for (const [streamId, listener] of this.listeners) {
+            listener({ stream_id: streamId, type: 'error', content: 'WebSocket closed' });
+          }
+        };
+        socket.onmessage = (message) => {
+          const event: WsEvent = JSON.parse(message.data);
+          this.listeners.get(event.stream_id)?.(event);
+        };
+      });
+    }
+    return this.opening;
+  }
+
+  async *stream(request: ChatRequest): AsyncGenerator<StreamChunk> {
+    const socket = await this.connect();
+    const serialized = request.messages.map(message => JSON.stringify(message));
+
+    // 页面对话已有生成时，使用一次性的会话，不影响增量同步
+    const isMain = !this.mainBusy;
+    if (isMain) {
+      this.mainBusy = true;
+    }
+
+    const queue: WsEvent[] = [];
+    let wake: (() => void) | null = null;
+    let streamId: string | null = null;
+    let finished = false;
+
+    // 发送 chat 消息，返回本次使用的 stream_id；帧超过大小上限时返回 null
+    const send = (forceReset: boolean): string | null => {
+      const id = `stream-${this.nextId++}`;
+
+      // 服务端历史是本次消息的前缀时只发送新增部分，否则重置
+      const isPrefix = isMain && !forceReset
+        && this.synced.length <= serialized.length
+        && this.synced.every((message, i) => message === serialized[i]);
+
+      const frame = JSON.stringify({
+        type: 'chat',
+        stream_id: id,
+        conversation_id: isMain ? MAIN_CONVERSATION : id,
+        model: request.model,
+        messages: isPrefix ? request.messages.slice(this.synced.length) : request.messages,
+        reset: !isPrefix,
+        history_length: isPrefix ? this.synced.length : 0,
+        // 一次性会话不需要服务端保存历史
+        store: isMain,
+        hyper_params: request.hyper_params,
+        modalities: request.modalities,
+      });
+      if (new TextEncoder().encode(frame).length > WS_MAX_FRAME_BYTES) {
+        return null;
+      }
+
+      if (isMain && !isPrefix) {
+        this.synced = [];
+      }
+      this.listeners.set(id, (event) => {
+        queue.push(event);
+        wake?.();
+      });
+      socket.send(frame);
+      return id;
+    };
+
+    let failed = false;
+    let reply = '';
+    try {
+      streamId = send(false);
+      while (!finished) {
+        if (streamId === null) {
+          // 附件过大，本轮改用 SSE；服务端历史不变，下一轮仍可按 history_length 同步
+          yield* chatStreamSse(request);
+          finished = true;
+          break;
+        }
+
+        const event = queue.shift();
+        if (!event) {
+          await new Promise<void>(resolve => { wake = resolve; });
+          wake = null;
+          continue;
+        }
+
+        if (event.type === 'resync') {
+          // 服务端历史已被淘汰或不一致，重置后重发完整历史
+          this.listeners.delete(streamId);
+          streamId = send(true);
+        } else if (event.type === 'done') {
+          finished = true;
+          // 服务端只在成功时保存本轮历史
+          if (isMain && !failed) {
+            this.synced = [...serialized, JSON.stringify({ role: 'assistant', content: reply })];
+          }
+        } else if (event.type === 'cancelled') {
+          finished = true;
+        } else {
+          if (event.type === 'error') {
+            failed = true;
+          } else if (event.type === 'text' && event.content) {
+            reply += event.content;
+          }
+          yield { type: event.type as StreamChunk['type'], content: event.content, url: event.url };
+          if (event.type === 'error' && socket.readyState !== WebSocket.OPEN) {
+            finished = true;
+          }
+        }
+      }
+    } finally {
+      if (streamId !== null) {
+        this.listeners.delete(streamId);
+      }
+      if (isMain) {
+        this.mainBusy = false;
+      }
+      // 调用方提前结束迭代时取消服务端生成
+      if (!finished && streamId !== null && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ type: 'cancel', stream_id: streamId }));
+      }
+    }
+  }
+}
+
+const chatSocket = new ChatSocket();
+
 /**
  * 非流式聊天（用于图片生成等）
  */
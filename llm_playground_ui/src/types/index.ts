@@ -90,6 +90,9 @@ export interface UploadResponse {
   file_type: 'image' | 'audio' | 'video' | 'unknown';
   data_url: string;
   size: number;
+  original_size: number;
+  bytes_saved: number;
+  cached: boolean;
 }
 
 // 流式响应数据
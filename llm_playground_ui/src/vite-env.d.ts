@@ -1,3 +1,6 @@
 /// <reference types="vite/client" />
 
-
+interface ImportMetaEnv {
+  readonly VITE_API_BASE_URL?: string;
+  readonly VITE_CHAT_TRANSPORT?: 'sse' | 'ws';
+}
@@ -10,6 +10,7 @@ export default defineConfig({
       '/api': {
         target: 'http://127.0.0.1:8000',
         changeOrigin: true,
+        ws: true, // 代理 /api/chat/ws
         rewrite: (path) => path, // 保持路径不变
       },
     },